@@ -4,7 +4,13 @@ Configuration Module
 Handles environment variables and application settings.
 """
 
+import logging
 import os
+import queue
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 from dotenv import load_dotenv
 import cloudinary
 import matplotlib
@@ -15,45 +21,121 @@ script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 env_path = os.path.join(script_dir, '.env')
 load_dotenv(env_path)
 
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Environment-driven application settings."""
+    update_interval_seconds: int
+    line_enabled: bool
+    save_graphs: bool
+    line_url: str | None
+    group_id: str | None
+    line_api_key: str | None
+    cloudinary_cloud_name: str | None
+    cloudinary_api_key: str | None
+    cloudinary_api_secret: str | None
+    rebuild_font_cache: bool
+
+
+@lru_cache(maxsize=1)
+def get_config() -> Settings:
+    """Read settings from the environment once and cache them."""
+    return Settings(
+        update_interval_seconds=int(os.getenv('UPDATE_INTERVAL_MINUTES', '2')) * 60,
+        line_enabled=os.getenv('SEND_TO_LINE', 'true').lower() == 'true',
+        save_graphs=os.getenv('SAVE_GRAPHS', 'false').lower() == 'true',
+        line_url=os.getenv('LINE_URL'),
+        group_id=os.getenv('GROUP_ID'),
+        line_api_key=os.getenv('LINE_API_KEY'),
+        cloudinary_cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
+        cloudinary_api_key=os.getenv('CLOUDINARY_API_KEY'),
+        cloudinary_api_secret=os.getenv('CLOUDINARY_API_SECRET'),
+        rebuild_font_cache=os.getenv('REBUILD_FONT_CACHE', '0') == '1',
+    )
+
+
+def init_logging() -> QueueListener:
+    """
+    Route log records through a queue so console I/O runs on a background thread.
+    
+    Returns:
+        The started listener; call stop() on shutdown to flush pending records
+    """
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    
+    # The queue handler only merges args into the message; the listener applies LOG_FORMAT
+    logging.basicConfig(level=logging.INFO, format='%(message)s',
+                        handlers=[QueueHandler(log_queue)], force=True)
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    return listener
+
+
+def init_worker():
+    """Initialize a render worker process."""
+    # A forked copy of the log queue has no listener, so workers log directly
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, stream=sys.stdout, force=True)
+    init_matplotlib()
+
 
 def init_cloudinary():
     """Initialize Cloudinary configuration."""
+    config = get_config()
     cloudinary.config(
-        cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
-        api_key=os.getenv('CLOUDINARY_API_KEY'),
-        api_secret=os.getenv('CLOUDINARY_API_SECRET'),
+        cloud_name=config.cloudinary_cloud_name,
+        api_key=config.cloudinary_api_key,
+        api_secret=config.cloudinary_api_secret,
         secure=True
     )
 
 
-def init_matplotlib():
-    """Configure matplotlib for Thai character support."""
-    matplotlib.use('Agg')
-    fm._load_fontmanager(try_read_cache=False)
-    
-    import matplotlib.pyplot as plt
-    
+def _select_fonts(font_manager) -> list[str]:
+    """Pick the available fonts from the candidate list, in priority order."""
     # Auto-detect available Thai fonts, fall back gracefully on Mac
-    available_fonts = [f.name for f in fm.fontManager.ttflist]
+    available_fonts = {f.name for f in font_manager.ttflist}
     
     # Priority: Thai fonts (Docker) -> System fonts (Mac)
     font_candidates = ['Laksaman', 'Sawasdee New', 'Arial Unicode MS', 'DejaVu Sans', 'sans-serif']
-    selected_fonts = [font for font in font_candidates if font in available_fonts or font == 'sans-serif']
+    return [font for font in font_candidates if font in available_fonts or font == 'sans-serif']
+
+
+# Importing font_manager loads the cached font list, so this costs no extra scan
+SELECTED_FONTS = _select_fonts(fm.fontManager)
+
+
+def rebuild_font_cache():
+    """
+    Rescan system fonts and load the result into the existing font manager.
+    
+    The scan also rewrites matplotlib's cache file, so render workers started
+    afterwards load the fresh list without scanning again.
+    """
+    global SELECTED_FONTS
+    rebuilt = fm._load_fontmanager(try_read_cache=False)
+    # Update in place: backend_agg and matplotlib.text bound this instance at import
+    fm.fontManager.__dict__.update(rebuilt.__dict__)
+    fm.fontManager._findfont_cached.cache_clear()
+    SELECTED_FONTS = _select_fonts(fm.fontManager)
+
+
+def init_matplotlib():
+    """Configure matplotlib for Thai character support."""
+    # Prefer mplcairo's faster line rendering, fall back to Agg
+    try:
+        import mplcairo.base  # noqa: F401
+        matplotlib.use('module://mplcairo.base')
+    except ImportError:
+        matplotlib.use('Agg')
+    
+    import matplotlib.pyplot as plt
     
     plt.rcParams['font.family'] = 'sans-serif'
-    plt.rcParams['font.sans-serif'] = selected_fonts
+    plt.rcParams['font.sans-serif'] = SELECTED_FONTS
     plt.rcParams['axes.unicode_minus'] = False
     
     matplotlib.rcParams['pdf.fonttype'] = 42
     matplotlib.rcParams['ps.fonttype'] = 42
-
-
-def get_update_interval() -> int:
-    """Get update interval in seconds from environment."""
-    interval_minutes = int(os.getenv('UPDATE_INTERVAL_MINUTES', '2'))
-    return interval_minutes * 60
-
-
-def is_line_enabled() -> bool:
-    """Check if LINE notifications are enabled."""
-    return os.getenv('SEND_TO_LINE', 'true').lower() == 'true'
@@ -4,98 +4,213 @@ Data Processing Module
 Extracts and processes data from websocket payloads.
 """
 
-import json
+import warnings
+import msgspec
+import numpy as np
 from datetime import datetime
 
+GraphData = tuple[np.ndarray, np.ndarray]
 
-def parse_message(payload: dict) -> dict:
+
+class Graph(msgspec.Struct):
+    """A value/time series from the station payload."""
+    value: list[float | None] = []
+    time: list[float] = []
+
+
+class Values(msgspec.Struct):
+    """Graph series carried by a station message."""
+    water_level_graph: dict[str, Graph] = {}
+    rain_graph: Graph | None = None
+
+
+class Basin(msgspec.Struct):
+    """River basin the station belongs to."""
+    name: str = ""
+
+
+class Message(msgspec.Struct):
+    """Station message; fields not declared here are skipped while decoding."""
+    code: str | int = ""
+    name: str = ""
+    basin: Basin = msgspec.field(default_factory=Basin)
+    water_level_warning: float | None = None
+    water_level_critical: float | None = None
+    values: Values = msgspec.field(default_factory=Values)
+
+
+class Payload(msgspec.Struct):
+    """Websocket payload; message may arrive double-encoded as a JSON string."""
+    message: Message | str = msgspec.field(default_factory=Message)
+
+
+# Built once; strict=False accepts numbers sent as strings
+_string_decoder = msgspec.json.Decoder(str)
+_payload_decoder = msgspec.json.Decoder(Payload, strict=False)
+_message_decoder = msgspec.json.Decoder(Message, strict=False)
+
+
+def _to_datetime64(timestamps: list[float]) -> np.ndarray:
+    """Convert Unix seconds to naive local-time datetime64 values."""
+    seconds = np.asarray(timestamps, dtype=np.int64)
+    if not seconds.size:
+        return seconds.astype('datetime64[s]')
+    
+    # Shift to local time like datetime.fromtimestamp (one offset per series)
+    offset = datetime.fromtimestamp(int(seconds[0])).astimezone().utcoffset()
+    return (seconds + int(offset.total_seconds())).view('datetime64[s]')
+
+
+def _to_arrays(graph: Graph) -> GraphData:
+    """Convert a graph series to equal-length (datetime64, float64) arrays."""
+    count = min(len(graph.value), len(graph.time))
+    time_points = _to_datetime64(graph.time[:count])
+    
+    return time_points, np.asarray(graph.value[:count], dtype=np.float64)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int = 1200) -> GraphData:
+    """
+    Downsample a series with Largest-Triangle-Three-Buckets.
+    
+    Keeps the first and last points and, from each bucket in between, the
+    point forming the largest triangle with the previously kept point and
+    the mean of the next bucket, preserving the visual shape of the line.
+    
+    Args:
+        x: Monotonic x values (numeric or datetime64)
+        y: Y values
+        n_out: Number of points to keep
+        
+    Returns:
+        Tuple of (x, y) downsampled to n_out points
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    
+    xf = x.astype(np.int64) if np.issubdtype(x.dtype, np.datetime64) else x
+    xf = np.asarray(xf, dtype=np.float64)
+    
+    # n_out - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    # Missing readings are NaN: ignore them in the averages, and where a whole
+    # triangle is undefined keep the bucket's first point so gaps stay visible
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for i in range(n_out - 2):
+            start, end = edges[i], edges[i + 1]
+            next_end = edges[i + 2] if i + 2 < len(edges) else n
+            avg_x = np.nanmean(xf[end:next_end])
+            avg_y = np.nanmean(y[end:next_end])
+            
+            area = np.abs((xf[a] - avg_x) * (y[start:end] - y[a])
+                          - (xf[a] - xf[start:end]) * (avg_y - y[a]))
+            a = start + (0 if np.isnan(area).all() else int(np.nanargmax(area)))
+            keep[i + 1] = a
+    
+    return x[keep], y[keep]
+
+
+def _unwrap(raw: bytes | str) -> bytes | str:
+    """Unescape a payload sent as a JSON string, leaving plain payloads untouched."""
+    # Sniff the first byte instead of decoding into a union and checking the result
+    stripped = raw.lstrip()
+    if stripped[:1] in (b'"', '"'):
+        return _string_decoder.decode(stripped)
+    return raw
+
+
+def decode_payload(payload: bytes | str) -> Message:
     """
-    Parse message field (handle double-encoded JSON).
+    Decode a websocket payload once into a typed Message.
+    
+    Both double-encoded forms (the whole payload, or the message field, sent
+    as a JSON string) are normalized here, so the extractors never re-parse.
     
     Args:
         payload: Raw websocket payload
         
     Returns:
-        Parsed message dictionary
+        Decoded station message
     """
-    message = payload.get("message", {})
+    message = _payload_decoder.decode(_unwrap(payload)).message
     if isinstance(message, str):
-        message = json.loads(message)
+        message = _message_decoder.decode(message)
     return message
 
 
-def extract_water_level_graph(payload: dict) -> tuple[list[datetime], list[float]]:
+def extract_all(message: Message) -> tuple[dict, GraphData, GraphData]:
     """
-    Extract water level graph data from websocket payload.
+    Extract everything the dashboard needs from a station message.
     
     Args:
-        payload: JSON data from websocket
+        message: Decoded station message
         
     Returns:
-        Tuple of (time_points, water_levels)
+        Tuple of (station_info, water_level_graph, rainfall_graph)
     """
-    message = parse_message(payload)
+    station = extract_station_info(message)
+    water_level = extract_water_level_graph(message)
+    rainfall = extract_rainfall_graph(message)
     
-    graph = (
-        message
-        .get("values", {})
-        .get("water_level_graph", {})
-        .get("0", {})
-    )
+    return station, water_level, rainfall
+
+
+def extract_water_level_graph(message: Message) -> GraphData:
+    """
+    Extract water level graph data from the message.
     
-    values = graph.get("value", [])
-    times = graph.get("time", [])
+    Args:
+        message: Decoded station message
+        
+    Returns:
+        Tuple of (time_points, water_levels)
+    """
+    graph = message.values.water_level_graph.get("0")
     
-    if not values or not times:
+    if graph is None or not graph.value or not graph.time:
         raise ValueError("water_level_graph data is missing")
     
-    count = min(len(values), len(times))
-    time_points = [datetime.fromtimestamp(ts) for ts in times[:count]]
-    
-    return time_points, values[:count]
+    return _to_arrays(graph)
 
 
-def extract_rainfall_graph(payload: dict) -> tuple[list[datetime], list[float]]:
+def extract_rainfall_graph(message: Message) -> GraphData:
     """
-    Extract rainfall graph data from websocket payload.
+    Extract rainfall graph data from the message.
     
     Args:
-        payload: JSON data from websocket
+        message: Decoded station message
         
     Returns:
         Tuple of (time_points, rainfall_values) in mm
     """
-    message = parse_message(payload)
+    graph = message.values.rain_graph
     
-    rain_data = message.get("values", {}).get("rain_graph", {})
-    values = rain_data.get("value", [])
-    times = rain_data.get("time", [])
+    if graph is None or not graph.value or not graph.time:
+        return _to_datetime64([]), np.empty(0, dtype=np.float64)
     
-    if not values or not times:
-        return [], []
-    
-    count = min(len(values), len(times))
-    time_points = [datetime.fromtimestamp(ts) for ts in times[:count]]
-    
-    return time_points, values[:count]
+    return _to_arrays(graph)
 
 
-def extract_station_info(payload: dict) -> dict:
+def extract_station_info(message: Message) -> dict:
     """
-    Extract station metadata from payload.
+    Extract station metadata from the message.
     
     Args:
-        payload: JSON data from websocket
+        message: Decoded station message
         
     Returns:
         Dictionary with station info: code, name, basin_name, warning_level, critical_level
     """
-    message = parse_message(payload)
-    
     return {
-        'code': message.get("code", ""),
-        'name': message.get("name", ""),
-        'basin_name': message.get("basin", {}).get("name", ""),
-        'warning_level': message.get("water_level_warning"),
-        'critical_level': message.get("water_level_critical")
+        'code': message.code,
+        'name': message.name,
+        'basin_name': message.basin.name,
+        'warning_level': message.water_level_warning,
+        'critical_level': message.water_level_critical
     }
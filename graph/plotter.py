@@ -4,12 +4,33 @@ Graph Plotting Module
 Generates multi-panel dashboard graphs.
 """
 
-import matplotlib.pyplot as plt
+import logging
+import os
+from functools import lru_cache
+from io import BytesIO
 import matplotlib.dates as mdates
-from .data_processor import extract_water_level_graph, extract_rainfall_graph, extract_station_info
+import numpy as np
+from matplotlib.figure import Figure
+from PIL import Image
+from .data_processor import Message, extract_all, lttb
 
+# Same renderer choice as init_matplotlib: mplcairo when installed, else Agg
+try:
+    from mplcairo.base import FigureCanvasCairo as FigureCanvas
+except ImportError:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
 
-def create_dashboard(data: dict, filename: str):
+log = logging.getLogger(__name__)
+
+# Stateless with respect to data, so one instance is shared by all axes
+_DATE_FMT = mdates.DateFormatter("%Y-%m-%d\n%H:%M")
+
+# Series longer than this are downsampled to _DOWNSAMPLE_POINTS before drawing
+_DOWNSAMPLE_THRESHOLD = 2000
+_DOWNSAMPLE_POINTS = 1200
+
+
+def create_dashboard(message: Message, station_id: str, filename: str | bytes | None = None) -> bytes:
     """
     Generate a multi-panel dashboard with water level, rainfall, and alerts.
     
@@ -17,117 +38,189 @@ def create_dashboard(data: dict, filename: str):
     1. Water Level with warning/critical thresholds
     2. Rainfall bar chart
     
+    Each station's figure is kept by its DashboardRenderer, so only the
+    data artists are replaced on later updates.
+    
     Args:
-        data: Websocket payload containing all data
-        filename: Output filename for the graph
+        message: Decoded station message containing all data
+        station_id: Station ID the renderer is cached under
+        filename: Optional path to also write the graph to disk
+        
+    Returns:
+        PNG image bytes
     """
-    # Extract all data
-    station = extract_station_info(data)
-    wl_times, wl_values = extract_water_level_graph(data)
-    rain_times, rain_values = extract_rainfall_graph(data)
-    
-    # Create figure with 2 subplots
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 10))
-    fig.suptitle(
-        f"{station['code']} - {station['name']} ({station['basin_name']})", 
-        fontsize=16, 
-        fontweight='bold'
-    )
-    
-    # Plot water level panel
-    _plot_water_level_panel(ax1, wl_times, wl_values, station)
-    
-    # Plot rainfall panel
-    _plot_rainfall_panel(ax2, rain_times, rain_values)
-    
-    # Save figure
-    plt.tight_layout()
-    plt.savefig(filename, dpi=150, bbox_inches='tight')
-    plt.close()
-    print(f"Dashboard saved to {filename}")
+    return get_renderer(station_id).update(message, filename)
 
 
-def _plot_water_level_panel(ax, times, values, station):
-    """Plot water level with alert zones."""
-    warning = station['warning_level']
-    critical = station['critical_level']
-    
-    # Main water level line
-    ax.plot(times, values, 
-            linewidth=2.5, 
-            color='#2E86AB',
-            label='ระดับน้ำ (Water Level)',
-            zorder=3)
-    
-    ax.fill_between(times, values, alpha=0.3, color='#2E86AB')
+# Unbounded: the monitor pins each station to one worker, so a process only sees its own stations
+@lru_cache(maxsize=None)
+def get_renderer(station_id: str) -> 'DashboardRenderer':
+    """Get the persistent renderer for a station, building it on first use."""
+    return DashboardRenderer()
+
+
+class DashboardRenderer:
+    """Persistent dashboard figure for one station, redrawn with new data on each update."""
     
-    # Warning threshold
-    if warning:
-        ax.axhline(y=warning, 
-                  color='#F77F00', 
-                  linestyle='--', 
-                  linewidth=2,
-                  label=f'ระดับเฝ้าระวัง ({warning}m)',
-                  zorder=2)
+    def __init__(self):
+        """Create the figure, axes, and static styling."""
+        fig = Figure(figsize=(14, 10), dpi=150, layout='constrained')
+        FigureCanvas(fig)
+        ax1, ax2 = fig.subplots(2, 1)
         
-        if critical:
-            ax.fill_between(times, warning, critical,
-                          alpha=0.15,
-                          color='#F77F00',
-                          label='เขตเฝ้าระวัง')
+        for ax in (ax1, ax2):
+            ax.xaxis_date()
+            ax.xaxis.set_major_formatter(_DATE_FMT)
+            ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+        
+        # Main water level line (data is set on every update)
+        self.line, = ax1.plot([], [], 
+                              linewidth=2.5, 
+                              color='#2E86AB',
+                              label='ระดับน้ำ (Water Level)',
+                              zorder=3,
+                              rasterized=True)
+        
+        # Rasterize the fills below the thresholds; thresholds and legend stay vector
+        ax1.set_rasterization_zorder(1.5)
+        ax1.set_ylabel("ระดับน้ำ (m)", fontsize=12, fontweight='bold')
+        ax1.grid(True, alpha=0.3, linestyle=':', linewidth=0.8)
+        
+        ax2.set_ylabel("ปริมาณน้ำฝน (mm)", fontsize=12, fontweight='bold')
+        ax2.set_xlabel("เวลา (Time)", fontsize=12, fontweight='bold')
+        
+        self.fig, self.ax1, self.ax2 = fig, ax1, ax2
+        # Data artists added by the last update, removed before the next one
+        self.artists = []
     
-    # Critical threshold
-    if critical:
-        ax.axhline(y=critical, 
-                  color='#D62828', 
-                  linestyle='--', 
-                  linewidth=2,
-                  label=f'ระดับวิกฤต ({critical}m)',
-                  zorder=2)
-        
-        y_max = max(max(values) if values else critical, critical * 1.1)
-        ax.fill_between(times, critical, y_max,
-                      alpha=0.15,
-                      color='#D62828',
-                      label='เขตวิกฤต')
+    def update(self, message: Message, filename: str | bytes | None = None) -> bytes:
+        """
+        Redraw the dashboard with a new station message.
+        
+        Args:
+            message: Decoded station message containing all data
+            filename: Optional path to also write the graph to disk
+            
+        Returns:
+            PNG image bytes
+        """
+        # Extract all data
+        station, (wl_times, wl_values), (rain_times, rain_values) = extract_all(message)
+        
+        # Remove data artists from the previous update
+        for artist in self.artists:
+            artist.remove()
+        self.artists.clear()
+        
+        fig = self.fig
+        fig.suptitle(
+            f"{station['code']} - {station['name']} ({station['basin_name']})", 
+            fontsize=16, 
+            fontweight='bold'
+        )
+        
+        # Plot water level panel
+        self._plot_water_level_panel(wl_times, wl_values, station)
+        
+        # Plot rainfall panel
+        self._plot_rainfall_panel(rain_times, rain_values)
+        
+        # Save figure: render once and encode the canvas RGBA buffer directly
+        fig.canvas.draw()
+        image = Image.frombuffer('RGBA', fig.canvas.get_width_height(),
+                                 fig.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+        buffer = BytesIO()
+        image.save(buffer, 'PNG', optimize=False, compress_level=3, dpi=(fig.dpi, fig.dpi))
+        png = buffer.getvalue()
+        
+        if filename:
+            # Write beside the target and rename, so readers never see a partial PNG.
+            # The suffix matches the path's type, so bytes paths reach the OS as-is.
+            tmp_filename = filename + (b'.tmp' if isinstance(filename, bytes) else '.tmp')
+            with open(tmp_filename, 'wb') as f:
+                f.write(png)
+            os.replace(tmp_filename, filename)
+            log.info("Dashboard saved to %r", filename)
+        
+        return png
     
-    # Styling
-    ax.set_ylabel("ระดับน้ำ (m)", fontsize=12, fontweight='bold')
-    ax.grid(True, alpha=0.3, linestyle=':', linewidth=0.8)
-    ax.legend(loc='upper left', framealpha=0.9, fontsize=10)
-    ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d\n%H:%M"))
-    ax.xaxis.set_major_locator(mdates.AutoDateLocator())
-
-
-def _plot_rainfall_panel(ax, times, values):
-    """Plot rainfall bar chart."""
-    if times and values:
-        # Filter non-zero rainfall
-        non_zero = [(t, v) for t, v in zip(times, values) if v > 0]
-        
-        if non_zero:
-            # Show recent 100 events
-            recent = non_zero[-100:]
-            filtered_times, filtered_values = zip(*recent)
+    def _plot_water_level_panel(self, times, values, station):
+        """Plot water level with alert zones."""
+        ax, artists = self.ax1, self.artists
+        warning = station['warning_level']
+        critical = station['critical_level']
+        
+        # Downsample dense series for drawing; thresholds still use the full data
+        plot_times, plot_values = times, values
+        if len(values) > _DOWNSAMPLE_THRESHOLD:
+            plot_times, plot_values = lttb(times, values, _DOWNSAMPLE_POINTS)
+        
+        self.line.set_data(plot_times, plot_values)
+        ax.relim()
+        
+        artists.append(ax.fill_between(plot_times, plot_values, alpha=0.3, color='#2E86AB', rasterized=True))
+        
+        # Warning threshold
+        if warning:
+            artists.append(ax.axhline(y=warning, 
+                                      color='#F77F00', 
+                                      linestyle='--', 
+                                      linewidth=2,
+                                      label=f'ระดับเฝ้าระวัง ({warning}m)',
+                                      zorder=2))
             
-            ax.bar(filtered_times, filtered_values,
-                  width=0.02,
-                  color='#06A77D',
-                  alpha=0.7,
-                  edgecolor='#05846A',
-                  linewidth=0.8)
+            if critical:
+                artists.append(ax.fill_between(plot_times, warning, critical,
+                                               alpha=0.15,
+                                               color='#F77F00',
+                                               label='เขตเฝ้าระวัง'))
+        
+        # Critical threshold
+        if critical:
+            artists.append(ax.axhline(y=critical, 
+                                      color='#D62828', 
+                                      linestyle='--', 
+                                      linewidth=2,
+                                      label=f'ระดับวิกฤต ({critical}m)',
+                                      zorder=2))
             
-            ax.set_ylabel("ปริมาณน้ำฝน (mm)", fontsize=12, fontweight='bold')
-            ax.set_xlabel("เวลา (Time)", fontsize=12, fontweight='bold')
-            ax.grid(True, alpha=0.3, axis='y', linestyle=':', linewidth=0.8)
-            ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d\n%H:%M"))
-            ax.xaxis.set_major_locator(mdates.AutoDateLocator())
-            return
+            # Single NumPy reduction over the full series (NaN gaps ignored)
+            y_max = max(float(np.nanmax(values, initial=critical)), critical * 1.1)
+            artists.append(ax.fill_between(plot_times, critical, np.full(len(plot_times), y_max),
+                                           alpha=0.15,
+                                           color='#D62828',
+                                           label='เขตวิกฤต'))
+        
+        ax.autoscale_view()
+        ax.legend(loc='upper left', framealpha=0.9, fontsize=10)
     
-    # No data case
-    ax.text(0.5, 0.5, 'ไม่มีข้อมูลฝน (No Rainfall Data)', 
-           ha='center', va='center', 
-           transform=ax.transAxes,
-           fontsize=14, color='gray')
-    ax.set_ylabel("ปริมาณน้ำฝน (mm)", fontsize=12, fontweight='bold')
-    ax.set_xlabel("เวลา (Time)", fontsize=12, fontweight='bold')
+    def _plot_rainfall_panel(self, times, values):
+        """Plot rainfall bar chart."""
+        ax, artists = self.ax2, self.artists
+        ax.relim()
+        
+        if len(times) and len(values):
+            # Filter non-zero rainfall, keeping the recent 100 events
+            recent = np.flatnonzero(values > 0)[-100:]
+            
+            if recent.size:
+                artists.append(ax.bar(times[recent], values[recent],
+                                      width=0.02,
+                                      color='#06A77D',
+                                      alpha=0.7,
+                                      edgecolor='#05846A',
+                                      linewidth=0.8,
+                                      rasterized=True))
+                
+                ax.grid(True, alpha=0.3, axis='y', linestyle=':', linewidth=0.8)
+                ax.tick_params(labelbottom=True, labelleft=True)
+                ax.autoscale_view()
+                return
+        
+        # No data case (limits would be left over from the previous update)
+        ax.grid(False)
+        ax.tick_params(labelbottom=False, labelleft=False)
+        artists.append(ax.text(0.5, 0.5, 'ไม่มีข้อมูลฝน (No Rainfall Data)', 
+                               ha='center', va='center', 
+                               transform=ax.transAxes,
+                               fontsize=14, color='gray'))
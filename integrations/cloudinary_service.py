@@ -4,28 +4,49 @@ Cloudinary Service Module
 Handles image uploads to Cloudinary.
 """
 
-import os
-import cloudinary.uploader
+import logging
+import time
+import cloudinary
+import cloudinary.utils
+from .http_client import client
 
+log = logging.getLogger(__name__)
 
-def upload_image(filename: str) -> str:
+
+async def upload_image(image: bytes, name: str) -> str:
     """
     Upload image to Cloudinary and return public URL.
     
+    Sends a signed request to the upload REST endpoint through the shared
+    async client, using credentials from cloudinary.config().
+    
     Args:
-        filename: Path to the image file
+        image: PNG image bytes
+        name: Image name, used for the Cloudinary public ID
         
     Returns:
         HTTPS URL of uploaded image
     """
     try:
-        upload_result = cloudinary.uploader.upload(
-            filename,
-            public_id=f"water_level_{os.path.basename(filename).split('.')[0]}"
+        config = cloudinary.config()
+        
+        params = {
+            "public_id": f"water_level_{name}",
+            "timestamp": int(time.time()),
+        }
+        params["signature"] = cloudinary.utils.api_sign_request(params, config.api_secret)
+        params["api_key"] = config.api_key
+        
+        response = await client.post(
+            cloudinary.utils.cloudinary_api_url("upload"),
+            data=params,
+            files={"file": (f"{name}.png", image, "image/png")},
+            timeout=30
         )
+        response.raise_for_status()
         
-        url = upload_result["secure_url"]
-        print(f"Uploaded to Cloudinary: {url}")
+        url = response.json()["secure_url"]
+        log.info("Uploaded to Cloudinary: %s", url)
         return url
         
     except Exception as e:
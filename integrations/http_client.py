@@ -0,0 +1,10 @@
+﻿"""
+HTTP Client Module
+==================
+Shared async HTTP client for external service integrations.
+"""
+
+import httpx
+
+# One pooled HTTP/2 client, reused by the Cloudinary and LINE integrations
+client = httpx.AsyncClient(http2=True, timeout=10)
@@ -4,39 +4,43 @@ LINE Messaging Service Module
 Handles LINE notification sending.
 """
 
-import os
+import logging
 import uuid
-import requests
 from .cloudinary_service import upload_image
+from .http_client import client
 
+log = logging.getLogger(__name__)
 
-def send_notification(filename: str, station_id: str):
+
+async def send_notification(image: bytes, station_id: str):
     """
     Upload graph image and send to LINE Messaging API.
     
     Args:
-        filename: Path to the graph image file
-        station_id: Station ID for logging
+        image: PNG image bytes of the graph
+        station_id: Station ID for logging and the image name
     """
-    from config.settings import is_line_enabled
+    from config.settings import get_config
+    
+    config = get_config()
     
     # Check if LINE is enabled
-    if not is_line_enabled():
-        print(f"LINE notifications disabled. Skipping station {station_id}")
+    if not config.line_enabled:
+        log.info("LINE notifications disabled. Skipping station %s", station_id)
         return
     
     # Load credentials
-    line_url = os.getenv('LINE_URL')
-    group_id = os.getenv('GROUP_ID')
-    api_key = os.getenv('LINE_API_KEY')
+    line_url = config.line_url
+    group_id = config.group_id
+    api_key = config.line_api_key
     
     if not all([line_url, group_id, api_key]):
-        print(f"Warning: LINE credentials not set. Skipping station {station_id}")
+        log.warning("LINE credentials not set. Skipping station %s", station_id)
         return
     
     try:
         # Upload to Cloudinary
-        image_url = upload_image(filename)
+        image_url = await upload_image(image, f"station_{station_id}")
         
         # Prepare LINE message
         payload = {
@@ -51,10 +55,9 @@ def send_notification(filename: str, station_id: str):
         }
         
         # Send to LINE
-        response = requests.post(
+        response = await client.post(
             line_url,
             headers={
-                "Content-Type": "application/json",
                 "Authorization": f"Bearer {api_key}",
                 "X-Line-Retry-Key": str(uuid.uuid4())
             },
@@ -63,9 +66,9 @@ def send_notification(filename: str, station_id: str):
         )
         
         if response.status_code == 200:
-            print(f"Successfully sent {filename} to LINE (Station {station_id})")
+            log.info("Successfully sent graph to LINE (Station %s)", station_id)
         else:
-            print(f"Failed to send to LINE: {response.status_code} - {response.text}")
+            log.error("Failed to send to LINE: %s - %s", response.status_code, response.text)
             
     except Exception as e:
-        print(f"Error sending to LINE: {e}")
+        log.error("Error sending to LINE: %s", e)
@@ -6,31 +6,71 @@ Main entry point for the application.
 Usage:
     python main.py              # Monitor station 703 (default)
     python main.py 703 704      # Monitor multiple stations concurrently
+    python main.py --singlecore # Render graphs in-process (for debugging)
 """
 
+import argparse
 import asyncio
-import sys
-from config.settings import init_cloudinary, init_matplotlib
-from services.websocket_service import monitor_station
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from config.settings import (get_config, init_cloudinary, init_logging, init_matplotlib,
+                             init_worker, rebuild_font_cache)
+from integrations.http_client import client
+from services.websocket_service import monitor_many
+
+log = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Water Level Monitoring System")
+    parser.add_argument('station_ids', nargs='*', default=["703"],
+                        help="Station IDs to monitor (default: 703)")
+    parser.add_argument('--singlecore', action='store_true',
+                        help="Render graphs in the main process instead of a process pool")
+    return parser.parse_args()
 
 
 async def main():
     """Initialize application and start monitoring."""
+    args = parse_args()
+    listener = init_logging()
+    
     # Initialize configurations
-    print("Initializing configurations...")
+    log.info("Initializing configurations...")
     init_cloudinary()
+    # Rescan fonts once here; workers pick up the rewritten cache file
+    if get_config().rebuild_font_cache:
+        rebuild_font_cache()
     init_matplotlib()
     
-    # Get station IDs from command-line arguments
-    station_ids = sys.argv[1:] if len(sys.argv) > 1 else ["703"]
-    print(f"Monitoring stations: {', '.join(station_ids)}")
+    station_ids = args.station_ids
+    log.info("Monitoring stations: %s", ", ".join(station_ids))
     
-    # Create monitoring tasks
-    tasks = [monitor_station(station_id) for station_id in station_ids]
+    # Render graphs in worker processes (matplotlib is not thread-safe).
+    # One single-worker pool per shard, so each worker only caches its own stations' figures.
+    if args.singlecore:
+        executors = []
+    else:
+        shards = min(os.cpu_count() or 1, len(station_ids))
+        executors = [ProcessPoolExecutor(max_workers=1, initializer=init_worker) for _ in range(shards)]
     
-    # Run all tasks concurrently
-    await asyncio.gather(*tasks)
+    try:
+        # Run all stations concurrently on one event loop
+        await monitor_many(station_ids, executors)
+    finally:
+        await client.aclose()
+        for executor in executors:
+            executor.shutdown(cancel_futures=True)
+        listener.stop()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # Use libuv's event loop when available (not supported on Windows)
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
@@ -5,51 +5,219 @@ Handles websocket connections and data streaming.
 """
 
 import asyncio
-import json
+import logging
+import os
+import ssl
+import time
+from concurrent.futures import Executor
+from concurrent.futures.process import BrokenProcessPool
+import msgspec
 import websockets
+from websockets.extensions.permessage_deflate import ClientPerMessageDeflateFactory
+from graph.data_processor import Message, decode_payload
 from graph.plotter import create_dashboard
 from integrations.line_service import send_notification
-from config.settings import get_update_interval
+from config.settings import get_config
 
+log = logging.getLogger(__name__)
 
-async def monitor_station(station_id: str):
+# Delay before reconnecting, doubled after each failed attempt
+RECONNECT_MIN_SECONDS = 1
+RECONNECT_MAX_SECONDS = 60
+
+# Items each pipeline queue holds before the stage feeding it has to wait
+PIPELINE_DEPTH = 2
+
+STATION_HOST = "telerid.rid.go.th"
+
+# One TLS context for every connection, so the CA store is loaded once
+_SSL = ssl.create_default_context()
+_SSL.set_alpn_protocols(['http/1.1'])
+
+# Largest deflate windows for the repetitive JSON payloads (the default offer leaves
+# the server's window unspecified); memLevel only affects our outgoing frames
+_DEFLATE = ClientPerMessageDeflateFactory(
+    server_max_window_bits=15,
+    client_max_window_bits=15,
+    compress_settings={'memLevel': 9},
+)
+
+# Per-message log formats; only the %-substitution happens per update
+_RECEIVED_MSG = "Received data from station %s"
+_SKIPPED_MSG = "Skipping update from station %s, last graph is under %d seconds old"
+
+
+async def render_dashboard(executor: Executor | None, message: Message, station_id: str,
+                           filename: bytes | None = None) -> bytes:
+    """
+    Generate a dashboard without blocking the event loop.
+    
+    Args:
+        executor: Process pool to render in, or None to render in-process
+        message: Decoded station message
+        station_id: Station ID the dashboard belongs to
+        filename: Optional path to also write the graph to disk
+        
+    Returns:
+        PNG image bytes
+    """
+    if executor is None:
+        return create_dashboard(message, station_id, filename)
+    
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, create_dashboard, message, station_id, filename)
+
+
+async def monitor_many(station_ids: list[str], executors: list[Executor] | None = None,
+                       max_concurrent_connects: int = 32):
+    """
+    Monitor many stations on one event loop.
+    
+    Connection handshakes are capped by a shared semaphore and start times
+    are staggered across one update interval so renders don't collide.
+    Each station is pinned to one executor, so only that worker keeps the
+    station's figure in memory.
+    
+    Args:
+        station_ids: Station IDs to monitor
+        executors: Single-worker render pools, shared round-robin between
+            stations (None renders in-process)
+        max_concurrent_connects: Maximum simultaneous connection attempts
+    """
+    connect_limit = asyncio.Semaphore(max_concurrent_connects)
+    stagger = get_config().update_interval_seconds / len(station_ids)
+    if not executors:
+        executors = [None]
+    
+    await asyncio.gather(*(
+        monitor_station(station_id, executors[i % len(executors)], connect_limit, i * stagger)
+        for i, station_id in enumerate(station_ids)
+    ))
+
+
+async def monitor_station(station_id: str, executor: Executor | None = None,
+                          connect_limit: asyncio.Semaphore | None = None,
+                          start_delay: float = 0):
     """
     Connect to water station websocket and generate graphs continuously.
     
+    Receiving, rendering and notifying run as separate tasks joined by
+    small queues, so a slow stage holds back the one before it instead of
+    letting work pile up.
+    
     Args:
         station_id: Station ID to monitor
+        executor: Process pool used for rendering (None renders in-process)
+        connect_limit: Semaphore bounding concurrent connection attempts
+        start_delay: Seconds to wait before the first connection
     """
-    uri = f"wss://telerid.rid.go.th/ws/station/{station_id}/"
+    if connect_limit is None:
+        connect_limit = asyncio.Semaphore(1)
+    
+    render_q = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+    notify_q = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+    
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(_receive_loop(station_id, render_q, connect_limit, start_delay))
+        tg.create_task(_render_loop(station_id, executor, render_q, notify_q))
+        tg.create_task(_notify_loop(station_id, notify_q))
+
+
+async def _receive_loop(station_id: str, render_q: asyncio.Queue,
+                        connect_limit: asyncio.Semaphore, start_delay: float):
+    """Keep a station connection open and queue decoded messages for rendering."""
+    uri = f"wss://{STATION_HOST}/ws/station/{station_id}/"
+    backoff = RECONNECT_MIN_SECONDS
+    
+    # Settings are fixed for the process lifetime, so read the interval once
+    interval = get_config().update_interval_seconds
+    # Render at most once per update interval; persists across reconnects
+    last_render = float('-inf')
+    
+    await asyncio.sleep(start_delay)
     
     while True:
         try:
-            async with websockets.connect(uri) as ws:
-                print(f"Connected to station {station_id}")
+            # Keep one connection open; pings keep it (and NAT state) alive between updates
+            async with connect_limit:
+                ws = await websockets.connect(uri, ssl=_SSL, extensions=[_DEFLATE],
+                                              ping_interval=20, ping_timeout=20, max_size=2**22)
+            
+            async with ws:
+                log.info("Connected to station %s", station_id)
+                backoff = RECONNECT_MIN_SECONDS
                 
-                async for msg in ws:
-                    # Parse JSON message
-                    data = json.loads(msg)
-                    print(f"Received data from station {station_id}")
-                    
-                    # Handle double-encoded JSON
-                    if isinstance(data, str):
-                        data = json.loads(data)
+                while True:
+                    # Raw frame bytes: skip UTF-8 decoding, msgspec parses bytes directly.
+                    # If the server is silent for an interval (e.g. it only pushes on connect),
+                    # reconnect for a fresh snapshot; this is routine, not a fault.
+                    try:
+                        msg = await asyncio.wait_for(ws.recv(decode=False), timeout=interval)
+                    except TimeoutError:
+                        log.info("No update from station %s in %s seconds, reconnecting", station_id, interval)
+                        break
                     
-                    # Generate dashboard
-                    filename = f"graphs/station_{station_id}.png"
-                    create_dashboard(data, filename)
+                    # Keep draining server pushes, but drop those arriving within the interval
+                    now = time.monotonic()
+                    if now - last_render < interval:
+                        log.debug(_SKIPPED_MSG, station_id, interval)
+                        continue
+                    log.info(_RECEIVED_MSG, station_id)
                     
-                    # Send to LINE
-                    send_notification(filename, station_id)
+                    # Decode straight into typed structs; a bad frame is skipped, not retried
+                    try:
+                        message = decode_payload(msg)
+                    except msgspec.DecodeError as e:
+                        log.warning("Skipping malformed payload from station %s: %s", station_id, e)
+                        continue
+                    last_render = now
                     
-                    # Exit websocket after first message
-                    break
+                    # Waits here while the renderer is still busy with earlier messages
+                    await render_q.put(message)
                     
-        except Exception as e:
-            print(f"Error with station {station_id}: {e}")
+        except (websockets.WebSocketException, OSError) as e:
+            log.warning("Connection to station %s lost: %s", station_id, e)
+        except Exception:
+            # Anything else would cancel this station's pipeline and stop every other station
+            log.exception("Unexpected error with station %s", station_id)
         
-        # Wait before next update
-        interval = get_update_interval()
-        minutes = interval // 60
-        print(f"Waiting {minutes} minutes before next update for station {station_id}...")
-        await asyncio.sleep(interval)
+        # Reconnect with exponential backoff
+        log.info("Reconnecting to station %s in %s seconds...", station_id, backoff)
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, RECONNECT_MAX_SECONDS)
+
+
+async def _render_loop(station_id: str, executor: Executor | None,
+                       render_q: asyncio.Queue, notify_q: asyncio.Queue):
+    """Render queued messages into dashboards and queue the images for sending."""
+    # Disk copy only when enabled; uploads are always sent from memory.
+    # Encoded once so each save passes the path to the OS as-is.
+    filename = os.fsencode(f"graphs/station_{station_id}.png") if get_config().save_graphs else None
+    
+    while True:
+        message = await render_q.get()
+        
+        # Render bugs are logged without tearing down the connection
+        try:
+            image = await render_dashboard(executor, message, station_id, filename)
+        except BrokenProcessPool:
+            # A worker died and every later render would fail too; exit so the container restarts
+            log.critical("Render pool is broken (station %s), shutting down", station_id)
+            raise
+        except Exception:
+            log.exception("Failed to render dashboard for station %s", station_id)
+            continue
+        
+        # Waits here while LINE is still sending earlier images
+        await notify_q.put(image)
+
+
+async def _notify_loop(station_id: str, notify_q: asyncio.Queue):
+    """Send queued dashboard images to LINE one at a time."""
+    while True:
+        image = await notify_q.get()
+        
+        try:
+            await send_notification(image, station_id)
+        except Exception:
+            log.exception("Failed to send notification for station %s", station_id)
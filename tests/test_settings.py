@@ -0,0 +1,49 @@
+﻿"""
+Settings Tests
+==============
+Checks that a font cache rebuild reaches the modules rendering the graphs.
+"""
+
+import copy
+import dataclasses
+import unittest
+from unittest import mock
+
+import matplotlib.font_manager as fm
+import matplotlib.text
+from matplotlib.backends import backend_agg
+
+from config import settings
+
+
+class RebuildFontCacheTest(unittest.TestCase):
+    """rebuild_font_cache() must update the manager other modules already hold."""
+
+    def setUp(self):
+        self._saved_state = dict(fm.fontManager.__dict__)
+        self._saved_fonts = settings.SELECTED_FONTS
+
+    def tearDown(self):
+        fm.fontManager.__dict__.clear()
+        fm.fontManager.__dict__.update(self._saved_state)
+        fm.fontManager._findfont_cached.cache_clear()
+        settings.SELECTED_FONTS = self._saved_fonts
+
+    def test_rebuilt_fonts_reach_bound_managers(self):
+        # Stand in for a rescan that finds a newly installed Thai font
+        rebuilt = copy.copy(fm.fontManager)
+        rebuilt.ttflist = fm.fontManager.ttflist + [
+            dataclasses.replace(fm.fontManager.ttflist[0], name='Laksaman')
+        ]
+
+        with mock.patch.object(fm, '_load_fontmanager', return_value=rebuilt):
+            settings.rebuild_font_cache()
+
+        for manager in (backend_agg._fontManager, matplotlib.text.fontManager, fm.fontManager):
+            self.assertIn('Laksaman', {f.name for f in manager.ttflist})
+        self.assertIs(backend_agg._fontManager, fm.fontManager)
+        self.assertEqual(settings.SELECTED_FONTS[0], 'Laksaman')
+
+
+if __name__ == '__main__':
+    unittest.main()